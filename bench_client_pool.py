@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+# Compares a fresh genai.Client per call against the pooled keep-alive client
+# used by server.py. Run from this directory: python bench_client_pool.py [N]
+sys.stdout.reconfigure(encoding='utf-8')
+
+load_dotenv()
+load_dotenv(dotenv_path="../.env")
+api_key = os.getenv("API_KEY")
+
+if not api_key:
+    print("API_KEY not found")
+    sys.exit(1)
+
+from google import genai
+from google.genai import types
+from server import ClientPool, InstrumentedTransport, PoolStats
+
+MODEL = "gemini-2.0-flash-exp"
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+
+def fresh_client(stats):
+    # Same instrumentation as the pool, but a new client (and connection) per call
+    return genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(client_args={"transport": InstrumentedTransport(stats)}),
+    )
+
+
+def run(label, get_client):
+    timings = []
+    for _ in range(N):
+        start = time.perf_counter()
+        get_client().models.get(model=MODEL)
+        timings.append((time.perf_counter() - start) * 1000)
+    steady = sorted(timings[1:]) or timings
+    print(f"{label}: first={timings[0]:.1f}ms  steady median={steady[len(steady) // 2]:.1f}ms")
+
+
+print("--- START BENCHMARK ---")
+fresh_stats = PoolStats()
+run("fresh client per call", lambda: fresh_client(fresh_stats))
+print(f"fresh stats: {fresh_stats.snapshot()}")
+
+pool = ClientPool(api_key)
+run("pooled keep-alive client", lambda: pool.client_for(MODEL))
+pool_stats = pool.stats()['profiles'][pool.profile_for(MODEL)]
+print(f"pool stats: {pool_stats}")
+for label, counts in (("fresh", fresh_stats.snapshot()), ("pooled", pool_stats)):
+    print(f"{label}: {counts['tls_handshakes']} TLS handshakes for {counts['requests']} requests")
+print("--- END BENCHMARK ---")
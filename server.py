@@ -1,14 +1,27 @@
 import os
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, send_from_directory
 from flask_cors import CORS
 import base64
 import io
+import csv
+import json
+import zipfile
+import queue
 from PIL import Image
 from google import genai
 from google.genai import types
+import httpx
 from dotenv import load_dotenv
 import wave
 import tempfile
+import threading
+import time
+import functools
+import hashlib
+import re
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import logging
 import traceback
@@ -33,11 +46,165 @@ api_key = os.getenv("API_KEY")
 if not api_key:
     logging.warning("API_KEY not found. Gemini calls will fail.")
 
-try:
-    client = genai.Client(api_key=api_key)
-    logging.info("Gemini Client initialized successfully.")
-except Exception as e:
-    logging.error(f"Failed to initialize Gemini Client: {e}")
+
+# --- Upstream Client Pool ---
+class InstrumentedTransport(httpx.HTTPTransport):
+    """HTTP transport that counts new TCP connections and TLS handshakes."""
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    def handle_request(self, request):
+        stats = self._stats
+        previous_trace = request.extensions.get("trace")
+        opened = []
+
+        def trace(event_name, info):
+            if event_name == "connection.connect_tcp.started":
+                stats.record("connect_attempts")
+            elif event_name == "connection.connect_tcp.complete":
+                stats.record("connections_opened")
+                opened.append(True)
+            elif event_name == "connection.start_tls.complete":
+                stats.record("tls_handshakes")
+            if previous_trace:
+                previous_trace(event_name, info)
+
+        request.extensions["trace"] = trace
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            stats.record("failed_requests")
+            raise
+        # Only completed requests count, so failed connects never look like reuse
+        stats.record("requests")
+        if not opened:
+            stats.record("reused_requests")
+        return response
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {
+            "requests": 0, "reused_requests": 0, "failed_requests": 0,
+            "connect_attempts": 0, "connections_opened": 0, "tls_handshakes": 0,
+        }
+
+    def record(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        requests = counts["requests"]
+        counts["reuse_ratio"] = round(counts["reused_requests"] / requests, 3) if requests else 0.0
+        return counts
+
+
+class ClientPool:
+    """
+    One long-lived genai.Client per profile, each with its own keep-alive
+    HTTP connection pool and timeout. httpx clients are thread-safe, so all
+    request threads share them instead of queueing on a single pool.
+    """
+
+    # profile -> (models, timeout in seconds)
+    PROFILES = {
+        "interactive": (["gemini-2.5-flash-preview-tts", "gemini-2.0-flash-exp"], 30),
+        "image": (["gemini-2.5-flash-image"], 120),
+        "video": (["veo-3.1-generate-preview"], 600),
+    }
+
+    def __init__(self, api_key, pool_size=10, keepalive_seconds=60, health_ttl=60):
+        self._api_key = api_key
+        self._pool_size = pool_size
+        self._keepalive_seconds = keepalive_seconds
+        self._health_ttl = health_ttl
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._stats = {name: PoolStats() for name in self.PROFILES}
+        self._health = {}  # profile -> (checked_at, ok, error)
+        # Separate from _lock: checks call client_for(), which takes _lock.
+        # Held for the whole check so concurrent callers share one probe.
+        self._health_lock = threading.Lock()
+        self._model_profile = {
+            model: name for name, (models, _) in self.PROFILES.items() for model in models
+        }
+
+    def _build(self, profile):
+        _, timeout = self.PROFILES[profile]
+        limits = httpx.Limits(
+            max_connections=self._pool_size,
+            max_keepalive_connections=self._pool_size,
+            keepalive_expiry=self._keepalive_seconds,
+        )
+        transport = InstrumentedTransport(self._stats[profile], limits=limits)
+        return genai.Client(
+            api_key=self._api_key,
+            http_options=types.HttpOptions(
+                timeout=timeout * 1000,  # milliseconds
+                client_args={"transport": transport},
+            ),
+        )
+
+    def profile_for(self, model):
+        return self._model_profile.get(model, "interactive")
+
+    def client_for(self, model):
+        profile = self.profile_for(model)
+        with self._lock:
+            if profile not in self._clients:
+                self._clients[profile] = self._build(profile)
+                logging.info(f"Gemini client for profile '{profile}' initialized.")
+            return self._clients[profile]
+
+    def health_check(self, force=False):
+        with self._health_lock:
+            return self._health_check(force)
+
+    def _health_check(self, force):
+        now = time.time()
+        report = {}
+        for profile, (models, _) in self.PROFILES.items():
+            cached = self._health.get(profile)
+            if force or not cached or now - cached[0] > self._health_ttl:
+                try:
+                    self.client_for(models[0]).models.get(model=models[0])
+                    cached = (now, True, None)
+                except Exception as e:
+                    logging.error(f"Health check failed for profile '{profile}': {e}")
+                    cached = (now, False, str(e))
+                self._health[profile] = cached
+            report[profile] = {"ok": cached[1], "error": cached[2], "checked_at": int(cached[0])}
+        return report
+
+    def stats(self):
+        return {
+            "pool_size": self._pool_size,
+            "keepalive_seconds": self._keepalive_seconds,
+            "profiles": {
+                name: dict(self._stats[name].snapshot(), timeout=self.PROFILES[name][1])
+                for name in self.PROFILES
+            },
+        }
+
+
+client_pool = ClientPool(
+    api_key,
+    pool_size=int(os.getenv("GENAI_POOL_SIZE", "10")),
+    keepalive_seconds=float(os.getenv("GENAI_KEEPALIVE_SECONDS", "60")),
+)
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    result = {"status": "running", "pool": client_pool.stats(), "intent_cache": intent_cache.stats()}
+    if request.args.get("deep"):
+        result["upstream"] = client_pool.health_check(force=request.args.get("deep") == "force")
+    return jsonify(result)
 
 
 # --- Ensure results directory exists ---
@@ -46,6 +213,365 @@ if not os.path.exists(results_dir):
     os.makedirs(results_dir)
     logging.info(f"Created directory: {results_dir}")
 
+# --- Priority Scheduler (interactive vs heavy generation) ---
+class SchedulerBusy(Exception):
+    """Raised when a request waited too long for an execution slot."""
+
+
+class PriorityScheduler:
+    """
+    Admits upstream work by priority class.
+    Each class has its own concurrency budget, and all classes share a total
+    budget for the upstream quota. When a slot frees up, queued work of a
+    higher-priority class is always admitted before lower-priority work.
+    """
+
+    def __init__(self, classes, total_limit):
+        # classes: {name: (priority, max_concurrent)} - lower priority runs first
+        self._cond = threading.Condition()
+        self._classes = dict(classes)
+        self._total_limit = total_limit
+        self._running = {name: 0 for name in classes}
+        self._waiting = {name: 0 for name in classes}
+        self._admitted = {name: 0 for name in classes}
+        self._rejected = {name: 0 for name in classes}
+        self._wait_total = {name: 0.0 for name in classes}
+        self._wait_max = {name: 0.0 for name in classes}
+
+    def _can_run(self, name):
+        priority, limit = self._classes[name]
+        if self._running[name] >= limit:
+            return False
+        if sum(self._running.values()) >= self._total_limit:
+            return False
+        # Pre-emption: higher-priority waiters that could run go first
+        for other, (other_priority, other_limit) in self._classes.items():
+            if other_priority < priority and self._waiting[other] and self._running[other] < other_limit:
+                return False
+        return True
+
+    @contextmanager
+    def slot(self, name, timeout=None):
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[name] += 1
+            try:
+                while not self._can_run(name):
+                    remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                    if remaining is not None and remaining <= 0:
+                        self._rejected[name] += 1
+                        raise SchedulerBusy(name)
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting[name] -= 1
+                # Waking others lets lower classes re-check once we stop waiting
+                self._cond.notify_all()
+            waited = time.monotonic() - start
+            self._running[name] += 1
+            self._admitted[name] += 1
+            self._wait_total[name] += waited
+            self._wait_max[name] = max(self._wait_max[name], waited)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running[name] -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            result = {}
+            for name, (priority, limit) in self._classes.items():
+                admitted = self._admitted[name]
+                result[name] = {
+                    "priority": priority,
+                    "limit": limit,
+                    "running": self._running[name],
+                    "queue_depth": self._waiting[name],
+                    "admitted": admitted,
+                    "rejected": self._rejected[name],
+                    "avg_wait_ms": round(self._wait_total[name] / admitted * 1000, 1) if admitted else 0.0,
+                    "max_wait_ms": round(self._wait_max[name] * 1000, 1),
+                }
+            return {"total_limit": self._total_limit, "classes": result}
+
+
+scheduler = PriorityScheduler(
+    classes={
+        "interactive": (0, int(os.getenv("INTERACTIVE_CONCURRENCY", "8"))),
+        "heavy": (1, int(os.getenv("HEAVY_CONCURRENCY", "2"))),
+        # Veo jobs hold their slot for minutes (submit, poll, download)
+        "video": (2, int(os.getenv("VIDEO_CONCURRENCY", "2"))),
+    },
+    total_limit=int(os.getenv("UPSTREAM_CONCURRENCY", "8")),
+)
+SCHEDULER_TIMEOUT = float(os.getenv("SCHEDULER_TIMEOUT", "120"))
+# Long enough for queued videos to wait out the ones rendering ahead of them
+VIDEO_SCHEDULER_TIMEOUT = float(os.getenv("VIDEO_SCHEDULER_TIMEOUT", "1800"))
+
+
+def scheduled(class_name, timeout=None):
+    """Run the decorated route inside a scheduler slot of the given class."""
+    if timeout is None:
+        timeout = SCHEDULER_TIMEOUT
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                with scheduler.slot(class_name, timeout=timeout):
+                    return view(*args, **kwargs)
+            except SchedulerBusy:
+                logging.warning(f"Scheduler busy, rejected {class_name} request: {request.path}")
+                return jsonify({"error": "Server busy, please try again."}), 503
+        return wrapper
+    return decorator
+
+
+@app.route('/scheduler_stats', methods=['GET'])
+def scheduler_stats():
+    return jsonify(scheduler.stats())
+
+
+# --- Live Result Broadcast (Server-Sent Events) ---
+class EventBroadcaster:
+    """
+    Fans out lightweight "result ready" events to every display in a session.
+    Each event is serialized once and the same SSE frame is shared by all
+    subscribers; screens then fetch the asset itself from /results/<id>.
+    """
+
+    def __init__(self, max_pending=50):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # session -> set of queue.Queue
+        self._last_event = {}   # session -> last SSE frame, replayed to late joiners
+        self._max_pending = max_pending
+
+    def subscribe(self, session):
+        q = queue.Queue(maxsize=self._max_pending)
+        with self._lock:
+            self._subscribers.setdefault(session, set()).add(q)
+            last = self._last_event.get(session)
+        if last:
+            q.put_nowait(last)
+        return q
+
+    def unsubscribe(self, session, q):
+        with self._lock:
+            subs = self._subscribers.get(session)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    del self._subscribers[session]
+
+    def publish(self, session, event_type, payload):
+        frame = f"event: {event_type}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        with self._lock:
+            self._last_event[session] = frame
+            subs = list(self._subscribers.get(session, ()))
+        for q in subs:
+            try:
+                q.put_nowait(frame)
+            except queue.Full:
+                # Slow display: drop the event rather than block the generator thread
+                logging.warning(f"SSE subscriber queue full in session '{session}', event dropped")
+
+    def subscriber_count(self, session):
+        with self._lock:
+            return len(self._subscribers.get(session, ()))
+
+
+broadcaster = EventBroadcaster()
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def publish_result(session, kind, result_id, **extra):
+    payload = {"kind": kind, "result_id": result_id, "url": f"/results/{result_id}", "ts": int(time.time())}
+    payload.update(extra)
+    result_manifest.append(dict(payload, session=session))
+    broadcaster.publish(session, "result", payload)
+
+
+@app.route('/events', methods=['GET'])
+def events():
+    session = request.args.get("session", "default")
+    q = broadcaster.subscribe(session)
+    logging.info(f"SSE subscriber joined session '{session}' ({broadcaster.subscriber_count(session)} total)")
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    yield q.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            broadcaster.unsubscribe(session, q)
+            logging.info(f"SSE subscriber left session '{session}'")
+
+    return Response(stream(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@app.route('/results/<path:result_id>', methods=['GET'])
+def get_result(result_id):
+    # Only published results are served (not debug inputs or the manifest).
+    # Ids carry a content hash, so the bytes behind a URL never change.
+    if not result_manifest.contains(result_id):
+        return jsonify({"error": "Result not found"}), 404
+    return send_from_directory(results_dir, result_id, conditional=True, max_age=3600)
+
+
+def content_id(prefix, data, ext):
+    """Immutable result id: regenerating the same student/job yields a new id."""
+    return f"{prefix}_{hashlib.sha1(data).hexdigest()[:12]}{ext}"
+
+
+# --- Session Export (streaming ZIP) ---
+class ResultManifest:
+    """Append-only JSON-lines log of stored results, used to export a session."""
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._ids = set()
+        for entry in self._read():
+            self._ids.add(entry.get("result_id"))
+
+    def _read(self):
+        if not os.path.exists(self._path):
+            return []
+        with open(self._path, encoding="utf-8") as fh:
+            lines = fh.readlines()
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            with open(self._path, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+            self._ids.add(entry.get("result_id"))
+
+    def contains(self, result_id):
+        with self._lock:
+            return result_id in self._ids
+
+    def entries(self, session):
+        with self._lock:
+            entries = self._read()
+        return [entry for entry in entries if entry.get("session") == session]
+
+
+result_manifest = ResultManifest(os.path.join(results_dir, "manifest.jsonl"))
+
+# Formats that are already compressed are stored as-is
+STORED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".mp4", ".webm", ".gif"}
+EXPORT_CHUNK_SIZE = 64 * 1024
+MANIFEST_FIELDS = ["result_id", "kind", "student", "job", "caption", "source", "ts", "time"]
+
+
+class _ZipStreamBuffer:
+    """Write-only sink for ZipFile; the export generator drains it after each chunk."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def build_export_manifest(entries):
+    """
+    Latest entry per result id whose file still exists on disk;
+    videos inherit student/job from their source image.
+    """
+    latest = OrderedDict()
+    for entry in entries:
+        latest.pop(entry["result_id"], None)
+        latest[entry["result_id"]] = entry
+    rows = []
+    for entry in latest.values():
+        if not os.path.isfile(os.path.join(results_dir, entry["result_id"])):
+            continue
+        source = latest.get(entry.get("source") or "", {})
+        ts = entry.get("ts", 0)
+        rows.append({
+            "result_id": entry["result_id"],
+            "kind": entry.get("kind", ""),
+            "student": entry.get("student") or source.get("student", ""),
+            "job": entry.get("job") or source.get("job", ""),
+            "caption": entry.get("caption") or source.get("caption", ""),
+            "source": entry.get("source") or "",
+            "ts": ts,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)),
+        })
+    return rows
+
+
+def stream_session_zip(rows):
+    """Yield a ZIP archive of the session's result files without buffering them."""
+    sink = _ZipStreamBuffer()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as zf:
+        for row in rows:
+            path = os.path.join(results_dir, row["result_id"])
+            if not os.path.isfile(path):
+                continue
+            ext = os.path.splitext(path)[1].lower()
+            zinfo = zipfile.ZipInfo(row["result_id"], date_time=time.localtime(os.path.getmtime(path))[:6])
+            zinfo.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            zinfo.file_size = os.path.getsize(path)  # lets ZipFile decide on Zip64 up front
+            with open(path, "rb") as src, zf.open(zinfo, mode="w") as dest:
+                while True:
+                    chunk = src.read(EXPORT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+
+        csv_buffer = io.StringIO()
+        writer = csv.DictWriter(csv_buffer, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+        zf.writestr("manifest.csv", csv_buffer.getvalue().encode("utf-8-sig"), compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("manifest.json", json.dumps(rows, ensure_ascii=False, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+    yield sink.drain()
+
+
+@app.route('/export', methods=['GET'])
+def export_session():
+    session = request.args.get("session", "default")
+    rows = build_export_manifest(result_manifest.entries(session))
+    if not rows:
+        return jsonify({"error": f"No results for session '{session}'"}), 404
+
+    safe_session = "".join([c for c in session if c.isalnum() or c in "-_"]) or "session"
+    logging.info(f"Exporting {len(rows)} results for session '{session}'")
+    return Response(stream_session_zip(rows), mimetype="application/zip", headers={
+        "Content-Disposition": f"attachment; filename=results_{safe_session}.zip",
+    })
+
+
 # --- Gender Detection from Vietnamese Name ---
 def detect_gender_from_name(name):
     """
@@ -102,8 +628,184 @@ def detect_gender_from_name(name):
     return "person"  # Ambiguous
 
 
+# --- Job Title Normalizer (local, no LLM) ---
+# Canonical job title -> other phrasings of the *same* job heard in class.
+# Only exact matches are merged, so 'bác sĩ nhi khoa' stays its own job.
+JOB_LEXICON = {
+    'bác sĩ': ['bác sỹ'],
+    'y tá': ['điều dưỡng'],
+    'nha sĩ': ['nha sỹ'],
+    'dược sĩ': ['dược sỹ'],
+    'công an': ['cảnh sát', 'chú công an', 'chú cảnh sát'],
+    'bộ đội': ['chú bộ đội', 'quân nhân'],
+    'lính cứu hỏa': ['lính cứu hoả', 'cứu hỏa', 'cứu hoả', 'chú lính cứu hỏa'],
+    'giáo viên': ['cô giáo', 'thầy giáo', 'thầy cô giáo'],
+    'kỹ sư': ['kĩ sư'],
+    'kiến trúc sư': [],
+    'lập trình viên': ['người lập trình'],
+    'nhà khoa học': [],
+    'phi hành gia': ['nhà du hành vũ trụ'],
+    'phi công': [],
+    'luật sư': [],
+    'ca sĩ': ['ca sỹ'],
+    'diễn viên': [],
+    'họa sĩ': ['hoạ sĩ', 'họa sỹ', 'hoạ sỹ'],
+    'nhà văn': [],
+    'nhiếp ảnh gia': ['thợ chụp ảnh'],
+    'cầu thủ bóng đá': ['cầu thủ đá bóng'],
+    'vận động viên': [],
+    'đầu bếp': [],
+    'thợ làm bánh': [],
+    'nông dân': [],
+    'doanh nhân': [],
+    'bác sĩ thú y': ['bác sỹ thú y'],
+    'tiếp viên hàng không': [],
+}
+
+# Lead-in phrases stripped (repeatedly) from free-form job descriptions
+JOB_LEAD_INS = [
+    'ước mơ của con là', 'ước mơ của em là', 'ước mơ của tôi là', 'ước mơ của mình là',
+    'ước mơ là', 'ước mơ', 'lớn lên', 'sau này', 'mai sau',
+    'con muốn trở thành', 'em muốn trở thành', 'muốn trở thành',
+    'con sẽ trở thành', 'em sẽ trở thành', 'sẽ trở thành', 'trở thành',
+    'con muốn làm', 'em muốn làm', 'muốn làm',
+    'con sẽ làm', 'em sẽ làm', 'sẽ làm',
+    'con là', 'em là', 'làm', 'là',
+]
+# Longest first so 'ước mơ của con là' wins over 'ước mơ'
+JOB_LEAD_INS.sort(key=len, reverse=True)
+
+
+def normalize_utterance(text):
+    """Lowercase, NFC-normalize, drop punctuation and collapse whitespace."""
+    text = unicodedata.normalize("NFC", text or "").lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def _strip_accents(text):
+    text = unicodedata.normalize("NFD", text).replace("đ", "d")
+    return "".join(c for c in text if unicodedata.category(c) != "Mn")
+
+
+def _build_alias_maps():
+    aliases = {}
+    unaccented = {}
+    for canonical, phrasings in JOB_LEXICON.items():
+        for alias in [canonical] + phrasings:
+            alias = normalize_utterance(alias)
+            aliases[alias] = canonical
+            key = _strip_accents(alias)
+            # Unaccented forms that could mean two different jobs are dropped
+            if unaccented.get(key, canonical) != canonical:
+                unaccented[key] = None
+            else:
+                unaccented[key] = canonical
+    return aliases, unaccented
+
+
+JOB_ALIASES, JOB_ALIASES_UNACCENTED = _build_alias_maps()
+
+
+def _strip_lead_in(normalized):
+    """Text after one leading lead-in phrase, or None if there is none."""
+    for lead_in in JOB_LEAD_INS:
+        if normalized.startswith(lead_in + " "):
+            return normalized[len(lead_in) + 1:]
+    return None
+
+
+def strip_lead_ins(normalized):
+    """Strip lead-in phrases until none match. Returns (remainder, stripped_any)."""
+    stripped = False
+    while True:
+        remainder = _strip_lead_in(normalized)
+        if remainder is None:
+            return normalized, stripped
+        normalized = remainder
+        stripped = True
+
+
+def canonical_job(normalized):
+    """Canonical title when normalized text is exactly a known alias, else None."""
+    if normalized in JOB_ALIASES:
+        return JOB_ALIASES[normalized]
+    # Unaccented input ('bac si') only, so accented text is never re-mapped
+    if normalized == _strip_accents(normalized):
+        return JOB_ALIASES_UNACCENTED.get(normalized)
+    return None
+
+
+def extract_job_command(text):
+    """Canonical job for '<lead-in> <alias>' utterances; None means ask the cache/LLM."""
+    remainder, stripped = strip_lead_ins(normalize_utterance(text))
+    if not stripped:
+        return None
+    return canonical_job(remainder)
+
+
+def normalize_job_title(job_description):
+    """
+    Stable title for a free-form job description.
+    Lead-ins are only dropped when what remains is a known alias, since bare
+    verbs start real jobs too ('làm vườn', 'làm bánh'); otherwise the
+    normalized wording is kept as-is.
+    """
+    normalized = normalize_utterance(job_description)
+    candidate = normalized
+    while True:
+        canonical = canonical_job(candidate)
+        if canonical:
+            return canonical
+        remainder = _strip_lead_in(candidate)
+        if remainder is None:
+            return normalized or "professional"
+        candidate = remainder
+
+
+# --- Intent Memo Cache ---
+class IntentCache:
+    """LRU cache of LLM intent responses keyed on utterance + filename set."""
+
+    def __init__(self, max_size=512):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_size = max_size
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key(utterance, filenames):
+        files_hash = hashlib.sha1("\n".join(sorted(filenames)).encode("utf-8")).hexdigest()
+        return (normalize_utterance(utterance), files_hash)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return dict(self._entries[key])
+            self._misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = dict(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+
+intent_cache = IntentCache(max_size=int(os.getenv("INTENT_CACHE_SIZE", "512")))
+
+
 # --- NEW: TTS Endpoint ---
 @app.route('/speak', methods=['POST'])
+@scheduled("interactive")
 def speak():
     try:
         data = request.json
@@ -111,6 +813,7 @@ def speak():
         if not text: return jsonify({"error": "No text"}), 400
         
         # Call Gemini TTS
+        client = client_pool.client_for("gemini-2.5-flash-preview-tts")
         response = client.models.generate_content(
            model="gemini-2.5-flash-preview-tts",
            contents=f"Say cheerfully in Vietnamese: {text}",
@@ -134,6 +837,7 @@ def speak():
 
 # --- NEW: STT Endpoint ---
 @app.route('/listen', methods=['POST'])
+@scheduled("interactive")
 def listen():
     try:
         if 'audio' not in request.files:
@@ -152,6 +856,7 @@ def listen():
         
         prompt = "Transcribe this audio exactly in Vietnamese."
         
+        client = client_pool.client_for("gemini-2.0-flash-exp")
         response = client.models.generate_content(
             model="gemini-2.0-flash-exp",
             contents=[
@@ -184,11 +889,14 @@ def home():
 
 
 @app.route('/animate', methods=['POST'])
+@scheduled("video", timeout=VIDEO_SCHEDULER_TIMEOUT)
 def animate():
     try:
         data = request.json
         image_data = data.get("image")
         prompt = data.get("prompt", "Cinematic movement")
+        source = os.path.basename(data.get("source", "") or "")
+        session = data.get("session", "default")
         
         if not image_data: return jsonify({"error": "No image"}), 400
         
@@ -221,6 +929,7 @@ def animate():
         # Convert bytes to types.Image for Veo
         img_input = types.Image(image_bytes=img_bytes)
 
+        client = client_pool.client_for("veo-3.1-generate-preview")
         operation = client.models.generate_videos(
             model="veo-3.1-generate-preview",
             prompt=prompt,
@@ -228,7 +937,6 @@ def animate():
         )
         
         # Poll for completion (Blocking)
-        import time
         while not operation.done:
              logging.info("Waiting for video generation...")
              time.sleep(5)
@@ -249,14 +957,24 @@ def animate():
              try:
                  generated_video = operation.response.generated_videos[0]
                  # We need the actual bytes. user script downloads to file.
-                 # We can download to memory or temp file.
-                 video_file_name = f"temp_video_{int(time.time())}.mp4"
-                 client.files.download(file=generated_video.video, config={'download_dest': video_file_name})
-                 
-                 # Read back
-                 with open(video_file_name, "rb") as vf:
-                     video_bytes = vf.read()
-                 os.remove(video_file_name) # Cleanup
+                 # Keep the file in results/ so other displays can fetch it.
+                 temp_name = os.path.join(results_dir, f"temp_video_{threading.get_ident()}_{int(time.time())}.mp4")
+                 renamed = False
+                 try:
+                     client.files.download(file=generated_video.video, config={'download_dest': temp_name})
+                     
+                     # Read back
+                     with open(temp_name, "rb") as vf:
+                         downloaded = vf.read()
+                     prefix = os.path.splitext(source)[0] if source else "video"
+                     video_id = content_id(prefix, downloaded, ".mp4")
+                     os.replace(temp_name, os.path.join(results_dir, video_id))
+                     renamed = True
+                 finally:
+                     if not renamed and os.path.exists(temp_name):
+                         os.remove(temp_name) # Cleanup partial download
+                 video_bytes = downloaded
+                 publish_result(session, "video", video_id, source=source or None)
                  
              except Exception as download_err:
                  logging.error(f"Download failed: {download_err}")
@@ -266,7 +984,7 @@ def animate():
              return jsonify({"error": "No video content returned"}), 500
         
         vid_b64 = base64.b64encode(video_bytes).decode('utf-8')
-        return jsonify({"video": vid_b64})
+        return jsonify({"video": vid_b64, "result_id": video_id})
 
     except Exception as e:
         logging.error(f"Animation Error: {e}")
@@ -274,6 +992,7 @@ def animate():
         return jsonify({"error": "Video generation temporarily unavailable."}), 200
 
 @app.route('/voice_command', methods=['POST'])
+@scheduled("interactive")
 def voice_command():
     try:
         data = request.json
@@ -283,6 +1002,18 @@ def voice_command():
         logging.info(f"Voice Command: {user_speech}")
         logging.info(f"Files: {filenames}")
 
+        # Common dream-job phrasings resolve locally without the LLM
+        job = extract_job_command(user_speech)
+        if job:
+            logging.info(f"Local job match: {job}")
+            return jsonify({"action": "SET_JOB", "target": job, "reply": f"Đã xác nhận ước mơ {job}."})
+
+        cache_key = IntentCache.key(user_speech, filenames)
+        cached = intent_cache.get(cache_key)
+        if cached:
+            logging.info("Intent cache hit")
+            return jsonify(cached)
+
         # Use Gemini to interpret intent
         prompt = (
             f"You are the brain of a photo classroom assistant. "
@@ -302,6 +1033,7 @@ def voice_command():
             f"4. Output strictly valid JSON."
         )
 
+        client = client_pool.client_for("gemini-2.0-flash-exp")
         response = client.models.generate_content(
             model="gemini-2.0-flash-exp",
             contents=prompt,
@@ -312,11 +1044,14 @@ def voice_command():
         try:
              result = response.parsed
              if not result: # Fallback if parsed is empty
-                 import json
                  result = json.loads(response.text)
         except:
-             import json
              result = json.loads(response.text)
+
+        if isinstance(result, dict) and result.get("action") in ("FIND_IMAGE", "SET_JOB", "AMBIGUOUS", "UNKNOWN"):
+            if result["action"] == "SET_JOB" and result.get("target"):
+                result["target"] = normalize_job_title(result["target"])
+            intent_cache.put(cache_key, result)
         
         return jsonify(result)
 
@@ -325,12 +1060,14 @@ def voice_command():
         return jsonify({"action": "ERROR", "reply": "Lỗi xử lý giọng nói."}), 500
 
 @app.route('/generate', methods=['POST'])
+@scheduled("heavy")
 def generate():
     try:
         data = request.json
         image_data = data.get("image")
-        job_description = data.get("job_description", "professional")
+        job_description = normalize_job_title(data.get("job_description", "professional"))
         student_name = data.get("student_name", "student")
+        session = data.get("session", "default")
         
         logging.info(f"Generate Request for: {student_name}") # Debug Log
 
@@ -374,6 +1111,7 @@ def generate():
             f"Maintain the person's likeness where possible but transform them into an adult {gender} professional."
         )
 
+        client = client_pool.client_for("gemini-2.5-flash-image")
         response = client.models.generate_content(
             model="gemini-2.5-flash-image",
             contents=[raw_image, prompt],
@@ -459,18 +1197,21 @@ def generate():
         # Sanitize filename
         safe_name = "".join([c for c in student_name if c.isalpha() or c.isdigit() or c==' ']).strip().replace(" ", "_")
         safe_job = "".join([c for c in job_description if c.isalpha() or c.isdigit() or c==' ']).strip().replace(" ", "_")
-        filename = f"{safe_name}_{safe_job}.png"
+        png_bytes = base64.b64decode(generated_image_base64)
+        filename = content_id(f"{safe_name}_{safe_job}", png_bytes, ".png")
         file_path = os.path.join(output_dir, filename)
         
         # Save to disk
         with open(file_path, "wb") as fh:
-            fh.write(base64.b64decode(generated_image_base64))
+            fh.write(png_bytes)
         logging.info(f"Saved to: {file_path}")
+        publish_result(session, "image", filename, caption=caption_text, student=student_name, job=job_description)
 
         return jsonify({
             "generated_image": generated_image_base64,
             "caption": caption_text, # Return simple text for UI too
-            "saved_path": file_path
+            "saved_path": file_path,
+            "result_id": filename
         })
     
     except Exception as e: